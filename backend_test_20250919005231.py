@@ -1,23 +1,62 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sys
 import json
+import logging
+from logging.handlers import MemoryHandler
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+log = logging.getLogger("tester")
+
+# Each running suite gets its own MemoryHandler (see main), keyed by thread;
+# the shared output handler skips records from those threads until the
+# suite's block is flushed into it
+_output_handler = None
+_suite_threads = set()
+_suite_flush_lock = threading.Lock()
+
+def configure_logging():
+    """Buffer tester output and write it to stdout in batches"""
+    global _output_handler
+    target = logging.StreamHandler(sys.stdout)
+    target.setFormatter(logging.Formatter("%(message)s"))
+    handler = MemoryHandler(capacity=200, target=target)
+    handler.addFilter(lambda record: record.thread not in _suite_threads)
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    _output_handler = handler
+    return handler
+
 class NYCTaxiAPITester:
     def __init__(self, base_url="https://delay-predict.preview.emergentagent.com/api"):
         self.base_url = base_url
         self.tests_run = 0
         self.tests_passed = 0
+        self._counter_lock = threading.Lock()
         self.session = requests.Session()
         self.session.headers.update({'Content-Type': 'application/json'})
+        # Reuse keep-alive connections across all tests; retry only failed
+        # connection attempts so read timeouts still surface as Timeout
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2)
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     def run_test(self, name, method, endpoint, expected_status, data=None, timeout=30):
         """Run a single API test"""
         url = f"{self.base_url}/{endpoint}" if not endpoint.startswith('http') else endpoint
         
-        self.tests_run += 1
-        print(f"\n🔍 Testing {name}...")
-        print(f"   URL: {url}")
+        with self._counter_lock:
+            self.tests_run += 1
+        log.info(f"\n🔍 Testing {name}...")
+        log.info(f"   URL: {url}")
         
         try:
             if method == 'GET':
@@ -29,32 +68,33 @@ class NYCTaxiAPITester:
             elif method == 'DELETE':
                 response = self.session.delete(url, timeout=timeout)
 
-            print(f"   Status Code: {response.status_code}")
+            log.info(f"   Status Code: {response.status_code}")
             
             success = response.status_code == expected_status
             if success:
-                self.tests_passed += 1
-                print(f"✅ PASSED - {name}")
+                with self._counter_lock:
+                    self.tests_passed += 1
+                log.info(f"✅ PASSED - {name}")
                 
                 # Try to parse JSON response
                 try:
                     json_response = response.json()
-                    print(f"   Response preview: {str(json_response)[:200]}...")
+                    log.info(f"   Response preview: {str(json_response)[:200]}...")
                     return True, json_response
                 except:
-                    print(f"   Response (text): {response.text[:200]}...")
+                    log.info(f"   Response (text): {response.text[:200]}...")
                     return True, response.text
             else:
-                print(f"❌ FAILED - {name}")
-                print(f"   Expected status: {expected_status}, got: {response.status_code}")
-                print(f"   Response: {response.text[:500]}...")
+                log.error(f"❌ FAILED - {name}")
+                log.error(f"   Expected status: {expected_status}, got: {response.status_code}")
+                log.error(f"   Response: {response.text[:500]}...")
                 return False, {}
 
         except requests.exceptions.Timeout:
-            print(f"❌ FAILED - {name} (Timeout after {timeout}s)")
+            log.error(f"❌ FAILED - {name} (Timeout after {timeout}s)")
             return False, {}
         except Exception as e:
-            print(f"❌ FAILED - {name} (Error: {str(e)})")
+            log.error(f"❌ FAILED - {name} (Error: {str(e)})")
             return False, {}
 
     def test_health_check(self):
@@ -68,10 +108,10 @@ class NYCTaxiAPITester:
         
         if success and isinstance(response, dict):
             if response.get('status') == 'healthy':
-                print("   ✓ Database connection verified")
+                log.info("   ✓ Database connection verified")
                 return True
             else:
-                print(f"   ⚠️  Health status: {response.get('status')}")
+                log.warning(f"   ⚠️  Health status: {response.get('status')}")
         
         return success
 
@@ -87,12 +127,12 @@ class NYCTaxiAPITester:
         
         if success and isinstance(response, dict):
             trips_loaded = response.get('trips_loaded', 0)
-            print(f"   ✓ Loaded {trips_loaded} taxi trips")
+            log.info(f"   ✓ Loaded {trips_loaded} taxi trips")
             if trips_loaded == 1000:
-                print("   ✓ Expected 1000 trips loaded successfully")
+                log.info("   ✓ Expected 1000 trips loaded successfully")
                 return True
             else:
-                print(f"   ⚠️  Expected 1000 trips, got {trips_loaded}")
+                log.warning(f"   ⚠️  Expected 1000 trips, got {trips_loaded}")
         
         return success
 
@@ -114,19 +154,19 @@ class NYCTaxiAPITester:
             
             missing_fields = [field for field in required_fields if field not in response]
             if not missing_fields:
-                print("   ✓ All required analytics fields present")
+                log.info("   ✓ All required analytics fields present")
                 
                 # Validate data types and ranges
                 if response['total_trips'] > 0:
-                    print(f"   ✓ Total trips: {response['total_trips']}")
+                    log.info(f"   ✓ Total trips: {response['total_trips']}")
                 if 0 <= response['delay_percentage'] <= 100:
-                    print(f"   ✓ Delay percentage: {response['delay_percentage']}%")
+                    log.info(f"   ✓ Delay percentage: {response['delay_percentage']}%")
                 if response['total_revenue'] > 0:
-                    print(f"   ✓ Total revenue: ${response['total_revenue']}")
+                    log.info(f"   ✓ Total revenue: ${response['total_revenue']}")
                 
                 return True
             else:
-                print(f"   ❌ Missing fields: {missing_fields}")
+                log.error(f"   ❌ Missing fields: {missing_fields}")
         
         return success
 
@@ -141,19 +181,19 @@ class NYCTaxiAPITester:
         
         if success and isinstance(response, list):
             if len(response) == 24:
-                print("   ✓ 24 hourly data points returned")
+                log.info("   ✓ 24 hourly data points returned")
                 
                 # Check first few entries
                 for i, hour_data in enumerate(response[:3]):
                     if all(key in hour_data for key in ['hour', 'avg_wait_time', 'trip_count', 'delay_percentage']):
-                        print(f"   ✓ Hour {hour_data['hour']}: {hour_data['avg_wait_time']}min wait, {hour_data['trip_count']} trips")
+                        log.info(f"   ✓ Hour {hour_data['hour']}: {hour_data['avg_wait_time']}min wait, {hour_data['trip_count']} trips")
                     else:
-                        print(f"   ❌ Hour {i} missing required fields")
+                        log.error(f"   ❌ Hour {i} missing required fields")
                         return False
                 
                 return True
             else:
-                print(f"   ❌ Expected 24 hours, got {len(response)}")
+                log.error(f"   ❌ Expected 24 hours, got {len(response)}")
         
         return success
 
@@ -168,26 +208,26 @@ class NYCTaxiAPITester:
         
         if success and isinstance(response, list):
             if len(response) <= 20:  # Should return top 20 zones
-                print(f"   ✓ {len(response)} zone analytics returned (max 20)")
+                log.info(f"   ✓ {len(response)} zone analytics returned (max 20)")
                 
                 # Check first few zones
                 for i, zone_data in enumerate(response[:3]):
                     required_fields = ['location_id', 'zone_name', 'trip_count', 'avg_wait_time', 'delay_percentage']
                     if all(key in zone_data for key in required_fields):
-                        print(f"   ✓ {zone_data['zone_name']}: {zone_data['trip_count']} trips, {zone_data['delay_percentage']}% delayed")
+                        log.info(f"   ✓ {zone_data['zone_name']}: {zone_data['trip_count']} trips, {zone_data['delay_percentage']}% delayed")
                     else:
-                        print(f"   ❌ Zone {i} missing required fields")
+                        log.error(f"   ❌ Zone {i} missing required fields")
                         return False
                 
                 return True
             else:
-                print(f"   ❌ Too many zones returned: {len(response)}")
+                log.error(f"   ❌ Too many zones returned: {len(response)}")
         
         return success
 
     def test_business_logic(self):
         """Test business logic calculations"""
-        print(f"\n🧮 Testing Business Logic...")
+        log.info(f"\n🧮 Testing Business Logic...")
         
         # Get overview data
         success, overview = self.run_test("Overview for Logic Test", "GET", "analytics/overview", 200)
@@ -201,72 +241,112 @@ class NYCTaxiAPITester:
             
         # Verify delay calculation logic
         if overview['delay_percentage'] >= 0 and overview['delay_percentage'] <= 100:
-            print("   ✓ Delay percentage within valid range")
+            log.info("   ✓ Delay percentage within valid range")
         else:
-            print(f"   ❌ Invalid delay percentage: {overview['delay_percentage']}")
+            log.error(f"   ❌ Invalid delay percentage: {overview['delay_percentage']}")
             return False
             
         # Verify total trips consistency
         total_hourly_trips = sum(hour['trip_count'] for hour in hourly)
         if total_hourly_trips == overview['total_trips']:
-            print("   ✓ Trip counts consistent between overview and hourly data")
+            log.info("   ✓ Trip counts consistent between overview and hourly data")
         else:
-            print(f"   ⚠️  Trip count mismatch: overview={overview['total_trips']}, hourly_sum={total_hourly_trips}")
+            log.warning(f"   ⚠️  Trip count mismatch: overview={overview['total_trips']}, hourly_sum={total_hourly_trips}")
             
         # Check for realistic values
         if 5 <= overview['avg_trip_duration'] <= 120:  # 5-120 minutes reasonable
-            print("   ✓ Average trip duration is realistic")
+            log.info("   ✓ Average trip duration is realistic")
         else:
-            print(f"   ⚠️  Unusual trip duration: {overview['avg_trip_duration']} minutes")
+            log.warning(f"   ⚠️  Unusual trip duration: {overview['avg_trip_duration']} minutes")
             
         if 1 <= overview['avg_fare'] <= 200:  # $1-200 reasonable for NYC
-            print("   ✓ Average fare is realistic")
+            log.info("   ✓ Average fare is realistic")
         else:
-            print(f"   ⚠️  Unusual fare amount: ${overview['avg_fare']}")
+            log.warning(f"   ⚠️  Unusual fare amount: ${overview['avg_fare']}")
             
         return True
 
 def main():
-    print("🚕 NYC Taxi Analytics API Testing")
-    print("=" * 50)
+    log.info("🚕 NYC Taxi Analytics API Testing")
+    log.info("=" * 50)
     
     tester = NYCTaxiAPITester()
     
-    # Test sequence
-    tests = [
+    # Data Ingestion runs first since the other suites depend on its data
+    ingestion_tests = [
+        ("Data Ingestion", tester.test_data_ingestion)
+    ]
+    # Independent I/O-bound suites run concurrently afterwards
+    concurrent_tests = [
         ("Health Check", tester.test_health_check),
-        ("Data Ingestion", tester.test_data_ingestion), 
         ("Analytics Overview", tester.test_analytics_overview),
         ("Hourly Analytics", tester.test_hourly_analytics),
         ("Zone Analytics", tester.test_zone_analytics),
         ("Business Logic", tester.test_business_logic)
     ]
+    tests = ingestion_tests + concurrent_tests
     
-    print(f"Running {len(tests)} test suites...\n")
+    log.info(f"Running {len(tests)} test suites...\n")
     
-    failed_tests = []
-    for test_name, test_func in tests:
+    def run_suite(test_name, test_func):
+        # Hold this suite's output and emit it as one block when it finishes
+        thread_id = threading.get_ident()
+        suite_handler = MemoryHandler(
+            capacity=10000,
+            flushLevel=logging.CRITICAL + 1,
+            target=_output_handler
+        )
+        suite_handler.addFilter(lambda record: record.thread == thread_id)
+        _suite_threads.add(thread_id)
+        log.addHandler(suite_handler)
         try:
-            if not test_func():
-                failed_tests.append(test_name)
+            return test_func()
         except Exception as e:
-            print(f"❌ {test_name} failed with exception: {str(e)}")
+            log.error(f"❌ {test_name} failed with exception: {str(e)}")
+            return False
+        finally:
+            log.removeHandler(suite_handler)
+            _suite_threads.discard(thread_id)
+            with _suite_flush_lock:
+                suite_handler.close()  # Flushes the block into the shared handler
+    
+    failed_tests = []
+    for test_name, test_func in ingestion_tests:
+        if not run_suite(test_name, test_func):
             failed_tests.append(test_name)
     
+    with ThreadPoolExecutor(max_workers=len(concurrent_tests)) as executor:
+        futures = {
+            executor.submit(run_suite, test_name, test_func): test_name
+            for test_name, test_func in concurrent_tests
+        }
+        for future in as_completed(futures):
+            if not future.result():
+                failed_tests.append(futures[future])
+    
+    # Report failures in suite order rather than completion order
+    suite_order = [test_name for test_name, _ in tests]
+    failed_tests.sort(key=suite_order.index)
+    
     # Final results
-    print("\n" + "=" * 50)
-    print("📊 TEST RESULTS SUMMARY")
-    print("=" * 50)
-    print(f"Total API calls: {tester.tests_run}")
-    print(f"Successful calls: {tester.tests_passed}")
-    print(f"Failed calls: {tester.tests_run - tester.tests_passed}")
+    log.info("\n" + "=" * 50)
+    log.info("📊 TEST RESULTS SUMMARY")
+    log.info("=" * 50)
+    log.info(f"Total API calls: {tester.tests_run}")
+    log.info(f"Successful calls: {tester.tests_passed}")
+    log.info(f"Failed calls: {tester.tests_run - tester.tests_passed}")
     
     if failed_tests:
-        print(f"\n❌ Failed test suites: {', '.join(failed_tests)}")
+        log.error(f"\n❌ Failed test suites: {', '.join(failed_tests)}")
         return 1
     else:
-        print(f"\n✅ All {len(tests)} test suites passed!")
+        log.info(f"\n✅ All {len(tests)} test suites passed!")
         return 0
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    handler = configure_logging()
+    try:
+        exit_code = main()
+    finally:
+        handler.close()  # Flushes any buffered output
+    sys.exit(exit_code)
\ No newline at end of file
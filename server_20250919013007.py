@@ -1,18 +1,18 @@
 from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
+import time
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timezone, date
-import pandas as pd
+from datetime import datetime
 import numpy as np
 from io import StringIO
-import requests
 
 
 ROOT_DIR = Path(__file__).parent
@@ -24,7 +24,7 @@ client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -32,7 +32,7 @@ api_router = APIRouter(prefix="/api")
 
 # Define Models for Taxi Data
 class TaxiTrip(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     pickup_datetime: datetime
     dropoff_datetime: datetime
     pickup_location_id: int
@@ -68,142 +68,182 @@ class ZoneAnalytics(BaseModel):
     avg_wait_time: float
     delay_percentage: float
 
-# Helper functions for data processing
-def prepare_for_mongo(data):
-    """Convert data types for MongoDB storage"""
-    if isinstance(data, dict):
-        for key, value in data.items():
-            if isinstance(value, (datetime, date)):
-                data[key] = value.isoformat()
-            elif pd.isna(value):
-                data[key] = None
-    return data
+# In-process cache of serialized analytics responses, keyed by (endpoint, ingest generation).
+# The generation is bumped on every ingest so stale entries are never served.
+# Endpoints read the generation once before querying and pass it to both helpers.
+ANALYTICS_CACHE_TTL_SECONDS = 30
+_cache = {}
+_ingest_gen = 0
 
-def parse_from_mongo(item):
-    """Parse data from MongoDB"""
-    if isinstance(item, dict):
-        for key, value in item.items():
-            if key in ['pickup_datetime', 'dropoff_datetime'] and isinstance(value, str):
-                try:
-                    item[key] = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                except:
-                    item[key] = datetime.now(timezone.utc)
-    return item
+def get_cached(name, gen):
+    """Return a cached analytics response if it is current and not expired"""
+    entry = _cache.get((name, gen))
+    if entry is not None and time.monotonic() - entry[0] < ANALYTICS_CACHE_TTL_SECONDS:
+        return Response(content=entry[1], media_type="application/json")
+    return None
+
+def set_cached(name, gen, response):
+    """Store a response's JSON body unless an ingest ran while it was computed"""
+    if gen == _ingest_gen:
+        _cache[(name, gen)] = (time.monotonic(), response.body)
+    return response
 
 # Data ingestion endpoint
 @api_router.post("/ingest-taxi-data")
 async def ingest_taxi_data():
     """Ingest NYC TLC taxi data"""
+    global _ingest_gen
+    # Each call stages into its own collection so overlapping ingests
+    # can't drop or mix into each other's half-finished inserts
+    staging = db[f"taxi_trips_staging_{uuid.uuid4().hex}"]
     try:
         # For MVP, we'll create realistic sample data
         # In production, this would fetch from NYC TLC API
         sample_data = generate_sample_taxi_data()
         
-        # Clear existing data
-        await db.taxi_trips.delete_many({})
+        # Load new data into the staging collection so readers never see
+        # an empty or partially inserted taxi_trips collection
+        await staging.insert_many(sample_data, ordered=False)
+        await ensure_indexes(staging)
         
-        # Insert new data
-        processed_data = []
-        for trip in sample_data:
-            trip_dict = prepare_for_mongo(trip.dict())
-            processed_data.append(trip_dict)
+        # Atomically swap the staging collection in, replacing existing data
+        await staging.rename("taxi_trips", dropTarget=True)
         
-        await db.taxi_trips.insert_many(processed_data)
+        # Invalidate cached analytics
+        _ingest_gen += 1
+        _cache.clear()
         
         return {
             "message": "Data ingestion completed",
-            "trips_loaded": len(processed_data)
+            "trips_loaded": len(sample_data)
         }
     except Exception as e:
+        # Don't leave an orphaned staging collection behind
+        try:
+            await staging.drop()
+        except Exception as drop_error:
+            logger.error(f"Failed to drop {staging.name}: {str(drop_error)}")
         raise HTTPException(status_code=500, detail=f"Data ingestion failed: {str(e)}")
 
 def generate_sample_taxi_data(num_trips: int = 1000):
     """Generate realistic sample taxi trip data"""
-    np.random.seed(42)  # For reproducible results
+    rng = np.random.default_rng(42)  # For reproducible results
+    n = num_trips
     
-    trips = []
-    base_date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    # Random date/time in January 2024 (naive UTC, as BSON Date stores it)
+    base_date = np.datetime64('2024-01-01T00:00:00', 'us')
+    days = rng.integers(0, 31, n)
+    hours = rng.integers(0, 24, n)
+    minutes = rng.integers(0, 60, n)
+    seconds = rng.integers(0, 60, n)
     
-    for i in range(num_trips):
-        # Random date/time in January 2024
-        days_offset = np.random.randint(0, 31)
-        hour = np.random.randint(0, 24)
-        minute = np.random.randint(0, 60)
-        
-        pickup_time = base_date.replace(
-            day=days_offset + 1,
-            hour=hour,
-            minute=minute,
-            second=np.random.randint(0, 60)
-        )
-        
-        # Trip duration (5-120 minutes)
-        trip_duration = max(5, np.random.normal(25, 15))
-        
-        # Calculate dropoff time properly
-        from datetime import timedelta
-        dropoff_time = pickup_time + timedelta(minutes=trip_duration)
-        
-        # Pickup wait time (0-30 minutes, most under 10)
-        wait_time = max(0, np.random.exponential(5))
-        is_delayed = wait_time > 10
-        
-        # Location IDs (NYC has ~265 taxi zones)
-        pickup_location = np.random.randint(1, 266)
-        dropoff_location = np.random.randint(1, 266)
-        
-        # Trip distance (0.1 - 20 miles)
-        distance = max(0.1, np.random.exponential(3))
-        
-        # Fare calculation (rough NYC taxi rates)
-        base_fare = 3.00
-        distance_fare = distance * 2.50
-        time_fare = trip_duration * 0.50
-        fare = base_fare + distance_fare + time_fare
-        
-        # Total with tips and taxes
-        total = fare * np.random.uniform(1.1, 1.3)
-        
-        trip = TaxiTrip(
-            pickup_datetime=pickup_time,
-            dropoff_datetime=dropoff_time,
-            pickup_location_id=pickup_location,
-            dropoff_location_id=dropoff_location,
-            passenger_count=np.random.choice([1, 2, 3, 4, 5], p=[0.5, 0.25, 0.15, 0.08, 0.02]),
-            trip_distance=round(distance, 2),
-            fare_amount=round(fare, 2),
-            total_amount=round(total, 2),
-            payment_type=np.random.choice([1, 2], p=[0.7, 0.3]),  # 1=credit, 2=cash
-            trip_duration_minutes=round(trip_duration, 1),
-            is_delayed=is_delayed,
-            pickup_wait_time_minutes=round(wait_time, 1)
-        )
-        trips.append(trip)
+    # Trip duration (5-120 minutes)
+    trip_duration = np.maximum(5, rng.normal(25, 15, n))
+    
+    offset_seconds = days * 86400 + hours * 3600 + minutes * 60 + seconds
+    pickup_times = base_date + offset_seconds.astype('timedelta64[s]')
+    duration_us = np.round(trip_duration * 60_000_000).astype(np.int64)
+    dropoff_times = pickup_times + duration_us.astype('timedelta64[us]')
+    
+    # Pickup wait time (0-30 minutes, most under 10)
+    wait_time = np.maximum(0, rng.exponential(5, n))
+    is_delayed = wait_time > 10
+    
+    # Location IDs (NYC has ~265 taxi zones)
+    pickup_location = rng.integers(1, 266, n)
+    dropoff_location = rng.integers(1, 266, n)
+    
+    # Trip distance (0.1 - 20 miles)
+    distance = np.maximum(0.1, rng.exponential(3, n))
     
-    return trips
+    # Fare calculation (rough NYC taxi rates)
+    fare = 3.00 + distance * 2.50 + trip_duration * 0.50
+    
+    # Total with tips and taxes
+    total = fare * rng.uniform(1.1, 1.3, n)
+    
+    passenger_count = rng.choice([1, 2, 3, 4, 5], n, p=[0.5, 0.25, 0.15, 0.08, 0.02])
+    payment_type = rng.choice([1, 2], n, p=[0.7, 0.3])  # 1=credit, 2=cash
+    
+    columns = zip(
+        pickup_times.tolist(),
+        dropoff_times.tolist(),
+        hours.tolist(),
+        pickup_location.tolist(),
+        dropoff_location.tolist(),
+        passenger_count.tolist(),
+        np.round(distance, 2).tolist(),
+        np.round(fare, 2).tolist(),
+        np.round(total, 2).tolist(),
+        payment_type.tolist(),
+        np.round(trip_duration, 1).tolist(),
+        is_delayed.tolist(),
+        np.round(wait_time, 1).tolist(),
+    )
+    
+    # Plain dicts matching the TaxiTrip schema plus pickup_hour, ready for insert_many
+    return [
+        {
+            "id": uuid.uuid4().hex,
+            "pickup_datetime": pickup,
+            "dropoff_datetime": dropoff,
+            "pickup_hour": hour,
+            "pickup_location_id": pu_loc,
+            "dropoff_location_id": do_loc,
+            "passenger_count": pax,
+            "trip_distance": dist,
+            "fare_amount": fare_amt,
+            "total_amount": total_amt,
+            "payment_type": pay,
+            "trip_duration_minutes": duration,
+            "is_delayed": delayed,
+            "pickup_wait_time_minutes": wait
+        }
+        for (pickup, dropoff, hour, pu_loc, do_loc, pax, dist, fare_amt,
+             total_amt, pay, duration, delayed, wait) in columns
+    ]
 
 # Analytics endpoints
 @api_router.get("/analytics/overview", response_model=TripAnalytics)
 async def get_trip_analytics():
     """Get overall trip analytics and KPIs"""
     try:
-        trips = await db.taxi_trips.find().to_list(length=None)
+        gen = _ingest_gen
+        cached = get_cached("overview", gen)
+        if cached is not None:
+            return cached
+        
+        pipeline = [
+            {"$group": {
+                "_id": None,
+                "total_trips": {"$sum": 1},
+                "avg_trip_duration": {"$avg": "$trip_duration_minutes"},
+                "avg_fare": {"$avg": "$fare_amount"},
+                "total_revenue": {"$sum": "$total_amount"},
+                "delayed_trips_count": {"$sum": {"$cond": ["$is_delayed", 1, 0]}},
+                "avg_wait_time": {"$avg": "$pickup_wait_time_minutes"}
+            }}
+        ]
+        stats = await db.taxi_trips.aggregate(pipeline).to_list(1)
         
-        if not trips:
-            return TripAnalytics(
-                total_trips=0, avg_trip_duration=0, avg_fare=0,
-                total_revenue=0, delayed_trips_count=0, delay_percentage=0, avg_wait_time=0
-            )
+        if not stats:
+            return ORJSONResponse(TripAnalytics.model_construct(
+                total_trips=0, avg_trip_duration=0.0, avg_fare=0.0,
+                total_revenue=0.0, delayed_trips_count=0, delay_percentage=0.0, avg_wait_time=0.0
+            ).model_dump())
         
-        total_trips = len(trips)
-        avg_duration = sum(trip['trip_duration_minutes'] for trip in trips) / total_trips
-        avg_fare = sum(trip['fare_amount'] for trip in trips) / total_trips
-        total_revenue = sum(trip['total_amount'] for trip in trips)
-        delayed_count = sum(1 for trip in trips if trip['is_delayed'])
+        stats = stats[0]
+        total_trips = stats['total_trips']
+        avg_duration = stats['avg_trip_duration']
+        avg_fare = stats['avg_fare']
+        total_revenue = stats['total_revenue']
+        delayed_count = stats['delayed_trips_count']
         delay_percentage = (delayed_count / total_trips) * 100
-        avg_wait_time = sum(trip['pickup_wait_time_minutes'] for trip in trips) / total_trips
+        avg_wait_time = stats['avg_wait_time']
         
-        return TripAnalytics(
+        # Returning a Response directly skips FastAPI's response_model
+        # re-validation of these server-computed values
+        result = TripAnalytics.model_construct(
             total_trips=total_trips,
             avg_trip_duration=round(avg_duration, 1),
             avg_fare=round(avg_fare, 2),
@@ -212,6 +252,8 @@ async def get_trip_analytics():
             delay_percentage=round(delay_percentage, 1),
             avg_wait_time=round(avg_wait_time, 1)
         )
+        
+        return set_cached("overview", gen, ORJSONResponse(result.model_dump()))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analytics error: {str(e)}")
 
@@ -219,44 +261,42 @@ async def get_trip_analytics():
 async def get_hourly_analytics():
     """Get hourly wait time and delay patterns"""
     try:
-        trips = await db.taxi_trips.find().to_list(length=None)
+        gen = _ingest_gen
+        cached = get_cached("hourly", gen)
+        if cached is not None:
+            return cached
         
-        hourly_data = {}
-        for trip in trips:
-            pickup_dt = datetime.fromisoformat(trip['pickup_datetime'].replace('Z', '+00:00'))
-            hour = pickup_dt.hour
-            
-            if hour not in hourly_data:
-                hourly_data[hour] = {
-                    'trips': [],
-                    'wait_times': [],
-                    'delays': []
-                }
-            
-            hourly_data[hour]['trips'].append(trip)
-            hourly_data[hour]['wait_times'].append(trip['pickup_wait_time_minutes'])
-            hourly_data[hour]['delays'].append(trip['is_delayed'])
+        pipeline = [
+            {"$group": {
+                "_id": "$pickup_hour",
+                "avg_wait_time": {"$avg": "$pickup_wait_time_minutes"},
+                "trip_count": {"$sum": 1},
+                "delayed": {"$sum": {"$cond": ["$is_delayed", 1, 0]}}
+            }}
+        ]
+        buckets = await db.taxi_trips.aggregate(pipeline).to_list(24)
+        hourly_data = {doc['_id']: doc for doc in buckets}
         
         result = []
         for hour in range(24):
             if hour in hourly_data:
                 data = hourly_data[hour]
-                avg_wait = sum(data['wait_times']) / len(data['wait_times'])
-                delay_pct = (sum(data['delays']) / len(data['delays'])) * 100
-                trip_count = len(data['trips'])
+                avg_wait = data['avg_wait_time']
+                trip_count = data['trip_count']
+                delay_pct = (data['delayed'] / trip_count) * 100
             else:
-                avg_wait = 0
-                delay_pct = 0
+                avg_wait = 0.0
+                delay_pct = 0.0
                 trip_count = 0
             
-            result.append(HourlyAnalytics(
+            result.append(HourlyAnalytics.model_construct(
                 hour=hour,
                 avg_wait_time=round(avg_wait, 1),
                 trip_count=trip_count,
                 delay_percentage=round(delay_pct, 1)
             ))
         
-        return result
+        return set_cached("hourly", gen, ORJSONResponse([item.model_dump() for item in result]))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Hourly analytics error: {str(e)}")
 
@@ -264,33 +304,35 @@ async def get_hourly_analytics():
 async def get_zone_analytics():
     """Get zone-wise performance analytics"""
     try:
-        trips = await db.taxi_trips.find().to_list(length=None)
+        gen = _ingest_gen
+        cached = get_cached("zones", gen)
+        if cached is not None:
+            return cached
         
-        zone_data = {}
-        for trip in trips:
-            location_id = trip['pickup_location_id']
-            
-            if location_id not in zone_data:
-                zone_data[location_id] = {
-                    'trips': [],
-                    'wait_times': [],
-                    'delays': []
-                }
-            
-            zone_data[location_id]['trips'].append(trip)
-            zone_data[location_id]['wait_times'].append(trip['pickup_wait_time_minutes'])
-            zone_data[location_id]['delays'].append(trip['is_delayed'])
+        pipeline = [
+            {"$group": {
+                "_id": "$pickup_location_id",
+                "trip_count": {"$sum": 1},
+                "avg_wait_time": {"$avg": "$pickup_wait_time_minutes"},
+                "delayed": {"$sum": {"$cond": ["$is_delayed", 1, 0]}}
+            }},
+            # Top 20 zones by trip count
+            {"$sort": {"trip_count": -1}},
+            {"$limit": 20}
+        ]
+        zones = await db.taxi_trips.aggregate(pipeline).to_list(20)
         
         result = []
-        for location_id, data in zone_data.items():
-            avg_wait = sum(data['wait_times']) / len(data['wait_times'])
-            delay_pct = (sum(data['delays']) / len(data['delays'])) * 100
-            trip_count = len(data['trips'])
+        for data in zones:
+            location_id = data['_id']
+            trip_count = data['trip_count']
+            avg_wait = data['avg_wait_time']
+            delay_pct = (data['delayed'] / trip_count) * 100
             
             # Mock zone names for now
             zone_name = f"Zone {location_id}"
             
-            result.append(ZoneAnalytics(
+            result.append(ZoneAnalytics.model_construct(
                 location_id=location_id,
                 zone_name=zone_name,
                 trip_count=trip_count,
@@ -298,9 +340,7 @@ async def get_zone_analytics():
                 delay_percentage=round(delay_pct, 1)
             ))
         
-        # Sort by trip count descending and return top 20
-        result.sort(key=lambda x: x.trip_count, reverse=True)
-        return result[:20]
+        return set_cached("zones", gen, ORJSONResponse([item.model_dump() for item in result]))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Zone analytics error: {str(e)}")
 
@@ -336,6 +376,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def ensure_indexes(collection=None):
+    """Create the indexes on the trip fields analytics group and filter by"""
+    collection = db.taxi_trips if collection is None else collection
+    await collection.create_index("pickup_datetime")
+    await collection.create_index("pickup_hour")
+    await collection.create_index("pickup_location_id")
+    await collection.create_index([("is_delayed", 1), ("pickup_location_id", 1)])
+
+@app.on_event("startup")
+async def create_indexes():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        # Keep serving so /api/health can report the database problem
+        logger.error(f"Index creation failed: {str(e)}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+if __name__ == "__main__":
+    import uvicorn
+    # Single worker: the analytics cache and its ingest generation are
+    # per-process, so extra workers would keep serving pre-ingest results
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools"
+    )
\ No newline at end of file